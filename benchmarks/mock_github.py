@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from datetime import datetime, timedelta
+from time import time
+from aiohttp import web
+
+# Repository sizes used by the benchmark scenarios; items are spread evenly over the year
+SCENARIOS = {
+    'small': {'commits': 500, 'issues': 50, 'pull_requests': 50, 'branches': 10, 'comments': 2},
+    'medium': {'commits': 10000, 'issues': 1000, 'pull_requests': 1000, 'branches': 100, 'comments': 3},
+    'huge': {'commits': 100000, 'issues': 10000, 'pull_requests': 10000, 'branches': 1000, 'comments': 3},
+}
+REPO = 'bench/repo'
+START = datetime(2023, 1, 1, 12)
+END = datetime(2023, 12, 31, 23, 59, 59)
+
+def timestamp(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def spread(count, index):
+    return START + (END - START) * index / max(count, 1)
+
+def make_repository(size):
+    commits = [{
+        'sha': hashlib.sha1(str(i).encode()).hexdigest(),
+        'commit': {
+            'message': f'Commit {i}\n\nLonger description of the change.',
+            'author': {'name': f'author{i % 50}', 'date': timestamp(spread(size['commits'], i))}
+        }
+    } for i in range(size['commits'])]
+    # Newest first, like GitHub
+    commits.reverse()
+
+    threads = []
+    total = size['issues'] + size['pull_requests']
+    for i in range(total):
+        created = spread(total, i)
+        thread = {
+            'number': i + 1,
+            'title': f'Thread {i + 1}',
+            'state': 'closed' if i % 4 else 'open',
+            'user': {'login': f'user{i % 200}'},
+            'body': 'Steps to reproduce the problem. ' * 10,
+            'created_at': timestamp(created),
+            'updated_at': timestamp(created + timedelta(days=2)),
+            # A few threads are silent and a few are long discussions
+            'comments': 0 if i % 7 == 0 else size['comments'] * (20 if i % 97 == 0 else 1),
+        }
+        # Pull requests are interleaved with issues in the proportion of the scenario
+        if (i + 1) * size['pull_requests'] // total > i * size['pull_requests'] // total:
+            thread['pull_request'] = {}
+        threads.append(thread)
+
+    branches = [{'name': f'branch-{i}', 'commit': {'sha': hashlib.sha1(f'b{i}'.encode()).hexdigest()}} for i in range(size['branches'])]
+    return {'commits': commits, 'threads': threads, 'branches': branches}
+
+def make_app(scenario='small', latency=0.0, quota=1000000, quota_window=5, search_quota=1000000, abuse_rate=0.0, error_rate=0.0):
+    # latency is in seconds; quota requests per token per quota_window seconds; abuse_rate and
+    # error_rate are the fractions of requests answered with a secondary-limit 403 or a 502
+    repository = make_repository(SCENARIOS[scenario])
+    threads_by_number = {thread['number']: thread for thread in repository['threads']}
+    stats = {'requests': 0, 'pages': 0, 'not_modified': 0, 'quota_exceeded': 0, 'abuse': 0, 'errors': 0}
+    budgets = {}
+    rng = random.Random(1)
+
+    def rate_limit(request, resource, limit):
+        # Each credential has a budget per resource that refills every quota_window seconds
+        key = (request.headers.get('Authorization'), resource)
+        now = int(time())
+        remaining, reset = budgets.get(key, (limit, now + quota_window))
+        if reset <= now:
+            remaining, reset = limit, now + quota_window
+        return key, remaining, reset
+
+    def respond(request, payload, resource='core', limit=None, links=None):
+        limit = limit or quota
+        key, remaining, reset = rate_limit(request, resource, limit)
+        headers = {'X-RateLimit-Limit': str(limit), 'X-RateLimit-Reset': str(reset), 'X-RateLimit-Resource': resource}
+        if remaining <= 0:
+            stats['quota_exceeded'] += 1
+            headers['X-RateLimit-Remaining'] = '0'
+            return web.json_response({'message': 'API rate limit exceeded'}, status=403, headers=headers)
+        if rng.random() < abuse_rate:
+            stats['abuse'] += 1
+            headers.update({'X-RateLimit-Remaining': str(remaining), 'Retry-After': '1'})
+            return web.json_response({'message': 'You have exceeded a secondary rate limit.'}, status=403, headers=headers)
+        if rng.random() < error_rate:
+            stats['errors'] += 1
+            return web.Response(status=502, text='Bad Gateway')
+
+        body = json.dumps(payload)
+        etag = '"' + hashlib.md5(body.encode()).hexdigest() + '"'
+        headers['ETag'] = etag
+        if links:
+            headers['Link'] = ', '.join(f'<{url}>; rel="{rel}"' for rel, url in links.items())
+        if request.headers.get('If-None-Match') == etag:
+            # Conditional requests that hit are free, as on GitHub
+            stats['not_modified'] += 1
+            headers['X-RateLimit-Remaining'] = str(remaining)
+            return web.Response(status=304, headers=headers)
+        budgets[key] = (remaining - 1, int(headers['X-RateLimit-Reset']))
+        headers['X-RateLimit-Remaining'] = str(remaining - 1)
+        stats['pages'] += 1
+        return web.Response(body=body, content_type='application/json', headers=headers)
+
+    def paginate(request, items):
+        per_page = min(int(request.query.get('per_page', 30)), 100)
+        page = int(request.query.get('page', 1))
+        last = max(1, -(-len(items) // per_page))
+        links = {}
+        if page < last:
+            url = request.url.with_query(dict(request.query, page=page + 1))
+            links['next'] = str(url)
+            links['last'] = str(url.with_query(dict(request.query, page=last)))
+        return respond(request, items[(page - 1) * per_page:page * per_page], links=links)
+
+    @web.middleware
+    async def count_requests(request, handler):
+        stats['requests'] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        return await handler(request)
+
+    async def commits(request):
+        since = request.query.get('since', '')
+        until = request.query.get('until', '9999')
+        return paginate(request, [commit for commit in repository['commits'] if since <= commit['commit']['author']['date'] <= until])
+
+    def listing(pull_requests):
+        async def handler(request):
+            # Like GitHub, /issues returns pull requests too and /pulls ignores since
+            threads = [thread for thread in repository['threads'] if not pull_requests or 'pull_request' in thread]
+            if not pull_requests and 'since' in request.query:
+                threads = [thread for thread in threads if thread['updated_at'] >= request.query['since']]
+            return paginate(request, [dict(thread, comments_url=f'{request.url.origin()}/repos/{REPO}/issues/{thread["number"]}/comments') for thread in threads])
+        return handler
+
+    def thread_comments(request, thread):
+        return [{
+            'id': thread['number'] * 100000 + i,
+            'issue_url': f'{request.url.origin()}/repos/{REPO}/issues/{thread["number"]}',
+            'user': {'login': f'user{i % 30}'},
+            'body': 'I can reproduce this as well.',
+            'created_at': thread['created_at'],
+            'updated_at': thread['created_at']
+        } for i in range(thread['comments'])]
+
+    async def comments(request):
+        thread = threads_by_number.get(int(request.match_info['number']))
+        if thread is None:
+            return web.json_response({'message': 'Not Found'}, status=404)
+        return paginate(request, thread_comments(request, thread))
+
+    async def repository_comments(request):
+        # Threads are kept in creation order, so their comments already come sorted by creation
+        since = request.query.get('since', '')
+        return paginate(request, [comment for thread in repository['threads'] if thread['created_at'] >= since
+                                  for comment in thread_comments(request, thread)])
+
+    async def branches(request):
+        return paginate(request, repository['branches'])
+
+    async def search(request):
+        query = request.query.get('q', '').split()
+        threads = repository['threads']
+        for qualifier in query:
+            name, _, value = qualifier.partition(':')
+            if qualifier == 'is:issue':
+                threads = [thread for thread in threads if 'pull_request' not in thread]
+            elif qualifier == 'is:pr':
+                threads = [thread for thread in threads if 'pull_request' in thread]
+            elif name == 'created':
+                low, _, high = value.partition('..')
+                threads = [thread for thread in threads if low <= thread['created_at'] <= high]
+            elif name == 'updated' and value.startswith('>='):
+                threads = [thread for thread in threads if thread['updated_at'] >= value[2:]]
+        per_page = min(int(request.query.get('per_page', 30)), 100)
+        page = int(request.query.get('page', 1))
+        # Search only ever returns the first 1000 results of a query
+        items = threads[:1000][(page - 1) * per_page:page * per_page]
+        return respond(request, {
+            'total_count': len(threads),
+            'incomplete_results': False,
+            'items': [dict(thread, comments_url=f'{request.url.origin()}/repos/{REPO}/issues/{thread["number"]}/comments') for thread in items]
+        }, 'search', search_quota)
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application(middlewares=[count_requests])
+    app.router.add_get(f'/repos/{REPO}/commits', commits)
+    app.router.add_get(f'/repos/{REPO}/issues', listing(False))
+    app.router.add_get(f'/repos/{REPO}/pulls', listing(True))
+    app.router.add_get(f'/repos/{REPO}/issues/{{number}}/comments', comments)
+    app.router.add_get(f'/repos/{REPO}/issues/comments', repository_comments)
+    app.router.add_get(f'/repos/{REPO}/branches', branches)
+    app.router.add_get('/search/issues', search)
+    app.router.add_get('/_stats', get_stats)
+    app['stats'] = stats
+    return app
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a fake GitHub REST API for benchmarks.")
+    parser.add_argument('--scenario', choices=SCENARIOS, default='small')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--quota', type=int, default=1000000, help="requests per token per quota window")
+    parser.add_argument('--quota-window', type=int, default=5, help="seconds until an exhausted quota resets")
+    parser.add_argument('--search-quota', type=int, default=1000000, help="search requests per token per quota window")
+    parser.add_argument('--abuse-rate', type=float, default=0.0, help="fraction of requests rejected with a secondary rate limit")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests failing with 502")
+    args = parser.parse_args(argv)
+
+    app = make_app(args.scenario, args.latency, args.quota, args.quota_window, args.search_quota, args.abuse_rate, args.error_rate)
+    print(f"Serving scenario '{args.scenario}' for {REPO} on http://127.0.0.1:{args.port}")
+    web.run_app(app, host='127.0.0.1', port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
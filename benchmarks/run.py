@@ -0,0 +1,169 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import urllib.request
+from time import sleep, time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'src')
+TABLES = ['commits', 'issues', 'pull_requests', 'branches']
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def server_stats(port):
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/_stats') as response:
+        return json.load(response)
+
+def start_server(scenario, port, args):
+    command = [sys.executable, os.path.join(BENCH_DIR, 'mock_github.py'), '--scenario', scenario, '--port', str(port),
+               '--latency', str(args.latency), '--quota', str(args.quota), '--quota-window', str(args.quota_window), '--search-quota', str(args.search_quota),
+               '--abuse-rate', str(args.abuse_rate), '--error-rate', str(args.error_rate)]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    # Building the huge repository takes a few seconds
+    deadline = time() + 60
+    while time() < deadline:
+        try:
+            server_stats(port)
+            return server
+        except OSError:
+            sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"Mock server for scenario '{scenario}' did not start.")
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_child(db):
+    # One mining run in a fresh process, so peak RSS belongs to this run alone
+    sys.path.insert(0, SRC_DIR)
+    sys.path.insert(0, BENCH_DIR)
+    import miner
+    from mock_github import REPO, START, END
+
+    if db == 'sqlite':
+        import sqlite_store
+        miner.create_schema_and_tables = sqlite_store.create_schema_and_tables
+        miner.insert_rows = sqlite_store.insert_rows
+        miner.get_high_water_marks = sqlite_store.get_high_water_marks
+        conn = sqlite_store.connect('bench.sqlite')
+    else:
+        from database import connect_db
+        conn = connect_db()
+
+    async def mine():
+        async with miner.create_engine() as engine:
+            return await miner.mine_repository(engine, conn, REPO, START.date(), END.date(), TABLES)
+
+    try:
+        start_time = time()
+        stats = asyncio.run(mine())
+        elapsed = time() - start_time
+    finally:
+        if db == 'postgres':
+            # Leave no benchmark schema behind in a real database
+            cursor = conn.cursor()
+            cursor.execute(f"DROP SCHEMA IF EXISTS {miner.get_schema_name(REPO)} CASCADE")
+            conn.commit()
+        conn.close()
+
+    print('BENCH_RESULT ' + json.dumps({
+        'elapsed': elapsed,
+        'rows': sum(count for count, _ in stats.values()),
+        'db_seconds': sum(db_elapsed for _, db_elapsed in stats.values()),
+        'peak_rss_mb': peak_rss_mb()
+    }))
+
+def run_scenario(scenario, args):
+    port = free_port()
+    server = start_server(scenario, port, args)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(os.environ,
+                       GITHUB_API_URL=f'http://127.0.0.1:{port}',
+                       TOKENS=','.join(f'bench-token-{i}' for i in range(args.tokens)),
+                       USERNAMES=','.join(f'bench-user-{i}' for i in range(args.tokens)),
+                       MAX_CONCURRENCY=str(args.concurrency),
+                       HTTP_CACHE_PATH=os.path.join(workdir, 'http_cache.sqlite') if args.warm else '',
+                       JOURNAL_PATH='')
+            for run in ['cold', 'warm'] if args.warm else ['cold']:
+                before = server_stats(port)
+                child = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', '--db', args.db],
+                                       cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE if not args.verbose else None, text=True)
+                after = server_stats(port)
+                lines = [line for line in child.stdout.splitlines() if line.startswith('BENCH_RESULT ')]
+                if child.returncode != 0 or not lines:
+                    print(child.stdout[-2000:])
+                    print(child.stderr[-2000:] if child.stderr else '')
+                    raise RuntimeError(f"Benchmark run '{scenario}/{run}' failed.")
+                result = json.loads(lines[-1][len('BENCH_RESULT '):])
+                delta = {key: after[key] - before[key] for key in after}
+                elapsed = max(result['elapsed'], 1e-6)
+                result.update(scenario=scenario, run=run, requests=delta['requests'], quota_used=delta['pages'],
+                              not_modified=delta['not_modified'], throttled=delta['quota_exceeded'] + delta['abuse'] + delta['errors'],
+                              pages_per_second=(delta['pages'] + delta['not_modified']) / elapsed,
+                              rows_per_second=result['rows'] / elapsed)
+                results.append(result)
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+def format_row(result):
+    rss = f"{result['peak_rss_mb']:.0f}" if result['peak_rss_mb'] is not None else 'n/a'
+    return (f"{result['scenario']:<8} {result['run']:<5} {result['elapsed']:>9.2f} {result['rows']:>9} {result['rows_per_second']:>9.0f} "
+            f"{result['pages_per_second']:>8.1f} {result['requests']:>9} {result['quota_used']:>7} {result['throttled']:>9} {rss:>8}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the miner against a local mock GitHub API.")
+    parser.add_argument('--scenarios', default='small,medium', help="comma-separated subset of small,medium,huge (default: small,medium)")
+    parser.add_argument('--db', choices=['sqlite', 'postgres'], default='sqlite', help="write to a SQLite stand-in or to the Postgres configured by PG_* (default: sqlite)")
+    parser.add_argument('--concurrency', type=int, default=24, help="MAX_CONCURRENCY for the miner (default: 24)")
+    parser.add_argument('--tokens', type=int, default=2, help="fake tokens in the pool (default: 2)")
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds the mock server waits before each response (default: 0.02)")
+    parser.add_argument('--quota', type=int, default=1000000, help="requests per token per quota window before the mock answers 403")
+    parser.add_argument('--search-quota', type=int, default=1000000, help="search requests per token per quota window (GitHub allows 30 per minute)")
+    parser.add_argument('--quota-window', type=int, default=5, help="seconds until an exhausted mock quota resets (default: 5)")
+    parser.add_argument('--abuse-rate', type=float, default=0.0, help="fraction of requests rejected with a secondary rate limit")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests failing with 502")
+    parser.add_argument('--warm', action='store_true', help="run each scenario again with the HTTP cache filled by the first run")
+    parser.add_argument('--output', help="also write the results as JSON to this file")
+    parser.add_argument('--verbose', action='store_true', help="show the miner's own output")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.db)
+        return 0
+
+    results = []
+    print(f"{'scenario':<8} {'run':<5} {'seconds':>9} {'rows':>9} {'rows/s':>9} {'pages/s':>8} {'requests':>9} {'quota':>7} {'throttled':>9} {'rss MB':>8}")
+    for scenario in [name.strip() for name in args.scenarios.split(',') if name.strip()]:
+        for result in run_scenario(scenario, args):
+            print(format_row(result))
+            results.append(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
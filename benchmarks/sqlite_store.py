@@ -0,0 +1,36 @@
+import json
+import sqlite3
+from time import time
+from database import get_schema_name, TABLE_COLUMNS, JSON_COLUMNS
+
+# SQLite stand-in for the Postgres functions in database.py, so benchmarks run without a server.
+# Each schema is an attached database file, which keeps the schema.table names working.
+
+def connect(path):
+    return sqlite3.connect(path, check_same_thread=False)
+
+def create_schema_and_tables(conn, repo_name, layout='jsonb', commit_partitions=None):
+    if layout != 'jsonb' or commit_partitions:
+        raise ValueError("The SQLite stand-in only supports the default storage layout; use --db postgres.")
+    schema_name = get_schema_name(repo_name)
+    if schema_name not in [row[1] for row in conn.execute("PRAGMA database_list")]:
+        conn.execute(f"ATTACH DATABASE ? AS {schema_name}", (f"{schema_name}.sqlite",))
+    for table, (key, columns, _) in TABLE_COLUMNS.items():
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {schema_name}.{table} ({', '.join(columns)}, PRIMARY KEY ({key}))")
+    conn.commit()
+
+def insert_rows(conn, schema_name, table, rows, batch_size=1000, layout='jsonb', commit_partitions=None):
+    key, columns, updates = TABLE_COLUMNS[table]
+    verb = 'INSERT OR REPLACE' if updates else 'INSERT OR IGNORE'
+    values = [tuple(json.dumps(row[column]) if column in JSON_COLUMNS else row[column] for column in columns) for row in rows]
+
+    start_time = time()
+    conn.executemany(f"{verb} INTO {schema_name}.{table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", values)
+    conn.commit()
+    return time() - start_time
+
+def get_high_water_marks(conn, schema_name):
+    marks = {}
+    for table, column in (('commits', 'date'), ('issues', 'updated_at'), ('pull_requests', 'updated_at')):
+        marks[table] = conn.execute(f"SELECT MAX({column}) FROM {schema_name}.{table}").fetchone()[0]
+    return marks
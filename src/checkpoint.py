@@ -0,0 +1,47 @@
+import json
+import sqlite3
+
+class Journal:
+    # Durable record of the pages and comment threads whose rows are already committed to Postgres.
+    # A run is keyed by repository and date range; its entries are dropped once it finishes, so only
+    # an interrupted run is resumed.
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS runs (
+            run_key TEXT PRIMARY KEY,
+            marks TEXT
+        )""")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS progress (
+            run_key TEXT,
+            stage TEXT,
+            item TEXT,
+            PRIMARY KEY (run_key, stage, item)
+        )""")
+
+    def resume(self, run_key):
+        # Incremental bounds the interrupted run started with, or None when there is nothing to resume
+        row = self.conn.execute("SELECT marks FROM runs WHERE run_key = ?", (run_key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def start(self, run_key, marks):
+        self.conn.execute("INSERT OR IGNORE INTO runs (run_key, marks) VALUES (?, ?)", (run_key, json.dumps(marks)))
+
+    def completed(self, run_key, stage):
+        rows = self.conn.execute("SELECT item FROM progress WHERE run_key = ? AND stage = ?", (run_key, stage))
+        return {row[0] for row in rows}
+
+    def mark(self, run_key, stage, items):
+        self.conn.execute("BEGIN")
+        self.conn.executemany("INSERT OR IGNORE INTO progress (run_key, stage, item) VALUES (?, ?, ?)",
+                              [(run_key, stage, item) for item in items])
+        self.conn.execute("COMMIT")
+
+    def finish(self, run_key):
+        self.conn.execute("DELETE FROM progress WHERE run_key = ?", (run_key,))
+        self.conn.execute("DELETE FROM runs WHERE run_key = ?", (run_key,))
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import sys
+from collections import defaultdict
+from datetime import datetime
+from time import time
+from dotenv import load_dotenv
+
+# Load environment variables before the miner reads its configuration
+load_dotenv()
+
+import miner
+from database import connect_db
+
+def parse_jobs(lines):
+    # One "<repo> <start YYYY-MM-DD> <end YYYY-MM-DD>" per line; the repo may be a URL or owner/repo
+    jobs = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        parts = line.replace(',', ' ').split()
+        if len(parts) != 3:
+            raise ValueError(f"Line {line_number}: expected '<repo> <start YYYY-MM-DD> <end YYYY-MM-DD>', got '{line}'.")
+        repo, start_date, end_date = parts
+        if '://' not in repo:
+            repo = f'https://github.com/{repo}'
+        try:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError(f"Line {line_number}: dates must be in the format YYYY-MM-DD.")
+        jobs.append((miner.get_repo_name(repo), start_date, end_date))
+    return jobs
+
+async def run_batch(jobs, tables, workers, concurrency, incremental=False):
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    results = []
+    # Jobs for the same repository share a schema, so they run one after the other
+    repo_locks = defaultdict(asyncio.Lock)
+
+    # Every repository shares one engine, so the connection pool, token pool and
+    # concurrency limit are global to the batch
+    async with miner.create_engine(concurrency) as engine:
+        async def worker():
+            conn = connect_db()
+            try:
+                while not queue.empty():
+                    repo_name, start_date, end_date = queue.get_nowait()
+                    async with repo_locks[repo_name]:
+                        print(f"[{repo_name}] Mining from {start_date} to {end_date}...")
+                        start_time = time()
+                        try:
+                            stats = await miner.mine_repository(engine, conn, repo_name, start_date, end_date, tables, incremental)
+                        except Exception as e:
+                            conn.rollback()
+                            print(f"[{repo_name}] Failed: {str(e)}")
+                            results.append((repo_name, None, time() - start_time))
+                            continue
+                    elapsed = time() - start_time
+                    rows = sum(count for count, _ in stats.values())
+                    counts = ', '.join(f"{miner.ENTITY_LABELS[table]}: {count}" for table, (count, _) in stats.items())
+                    print(f"[{repo_name}] Done in {elapsed:.2f} seconds - {counts} ({rows / max(elapsed, 1e-6):.0f} rows/s)")
+                    results.append((repo_name, rows, elapsed))
+            finally:
+                conn.close()
+
+        await asyncio.gather(*(worker() for _ in range(min(workers, len(jobs)))))
+        print(engine.metrics.summary())
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mine a batch of GitHub repositories without the GUI.")
+    parser.add_argument('jobs', help="file with one '<repo> <start YYYY-MM-DD> <end YYYY-MM-DD>' per line, or - to read stdin")
+    parser.add_argument('--workers', type=int, default=4, help="repositories mined at the same time (default: 4)")
+    parser.add_argument('--concurrency', type=int, default=miner.MAX_CONCURRENCY, help=f"requests in flight across all repositories (default: {miner.MAX_CONCURRENCY})")
+    parser.add_argument('--entities', default=','.join(miner.ENTITY_LABELS), help="comma-separated subset of commits,issues,pull_requests,branches")
+    parser.add_argument('--incremental', action='store_true', help="resume each repository from the newest rows already stored")
+    args = parser.parse_args(argv)
+
+    tables = [table.strip() for table in args.entities.split(',') if table.strip()]
+    unknown = [table for table in tables if table not in miner.ENTITY_LABELS]
+    if unknown:
+        parser.error(f"unknown entities: {', '.join(unknown)}")
+
+    try:
+        if args.jobs == '-':
+            jobs = parse_jobs(sys.stdin)
+        else:
+            with open(args.jobs, encoding='utf-8') as f:
+                jobs = parse_jobs(f)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if not jobs:
+        parser.error("no repositories to mine")
+
+    start_time = time()
+    results = asyncio.run(run_batch(jobs, tables, args.workers, args.concurrency, args.incremental))
+    elapsed = time() - start_time
+
+    failed = [repo_name for repo_name, rows, _ in results if rows is None]
+    rows = sum(rows for _, rows, _ in results if rows is not None)
+    print(f"Mined {len(results) - len(failed)}/{len(results)} repositories, {rows} rows in {elapsed:.2f} seconds ({rows / max(elapsed, 1e-6):.0f} rows/s).")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+import os
+from time import time
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import execute_values, Json
+
+def connect_db():
+    return psycopg2.connect(
+        host=os.getenv('PG_HOST'),
+        database=os.getenv('PG_DATABASE'),
+        user=os.getenv('PG_USER'),
+        password=os.getenv('PG_PASSWORD')
+    )
+
+def get_schema_name(repo_name):
+    return repo_name.replace('/', '_').replace('-', '_')
+
+STORAGE_LAYOUTS = ('jsonb', 'normalized')
+COMMIT_PARTITIONS = ('year', 'month')
+
+def check_storage_options(layout, commit_partitions):
+    if layout not in STORAGE_LAYOUTS:
+        raise ValueError(f"Unknown storage layout: {layout}. Use 'jsonb' or 'normalized'.")
+    if commit_partitions and commit_partitions not in COMMIT_PARTITIONS:
+        raise ValueError(f"Unknown commit partitioning: {commit_partitions}. Use 'year' or 'month'.")
+
+def create_schema_and_tables(conn, repo_name, layout='jsonb', commit_partitions=None):
+    # layout 'normalized' keeps issue and PR comments in their own indexed table instead of a JSONB
+    # column; commit_partitions ('year' or 'month') range-partitions a newly created commits table.
+    check_storage_options(layout, commit_partitions)
+    schema_name = get_schema_name(repo_name)
+    cursor = conn.cursor()
+    
+    # Create schema
+    cursor.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(schema_name)))
+
+    # Create commits table
+    if commit_partitions:
+        # The partition key has to be part of the primary key; a commit's date never changes
+        cursor.execute(sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {}.commits (
+            sha VARCHAR(255),
+            message TEXT,
+            date TIMESTAMP,
+            author VARCHAR(255),
+            PRIMARY KEY (sha, date)
+        ) PARTITION BY RANGE (date)""").format(sql.Identifier(schema_name)))
+    else:
+        cursor.execute(sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {}.commits (
+            sha VARCHAR(255) PRIMARY KEY,
+            message TEXT,
+            date TIMESTAMP,
+            author VARCHAR(255)
+        )""").format(sql.Identifier(schema_name)))
+
+    # The normalized layout keeps the description, the first entry of the JSONB list, on the thread itself
+    comments_column = sql.SQL(",\n        comments JSONB" if layout == 'jsonb' else ",\n        body TEXT,\n        created_at TIMESTAMP")
+    
+    # Create issues table
+    cursor.execute(sql.SQL("""
+    CREATE TABLE IF NOT EXISTS {}.issues (
+        number INTEGER PRIMARY KEY,
+        title TEXT,
+        state VARCHAR(50),
+        creator VARCHAR(255),
+        updated_at TIMESTAMP{}
+    )""").format(sql.Identifier(schema_name), comments_column))
+    cursor.execute(sql.SQL("ALTER TABLE {}.issues ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP").format(sql.Identifier(schema_name)))
+    
+    # Create pull_requests table
+    cursor.execute(sql.SQL("""
+    CREATE TABLE IF NOT EXISTS {}.pull_requests (
+        number INTEGER PRIMARY KEY,
+        title TEXT,
+        state VARCHAR(50),
+        creator VARCHAR(255),
+        updated_at TIMESTAMP{}
+    )""").format(sql.Identifier(schema_name), comments_column))
+    cursor.execute(sql.SQL("ALTER TABLE {}.pull_requests ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP").format(sql.Identifier(schema_name)))
+
+    if layout == 'normalized':
+        # Threads of a schema first mined with the JSONB layout get the description columns too
+        for table in ('issues', 'pull_requests'):
+            cursor.execute(sql.SQL("ALTER TABLE {}.{} ADD COLUMN IF NOT EXISTS body TEXT, ADD COLUMN IF NOT EXISTS created_at TIMESTAMP").format(
+                sql.Identifier(schema_name), sql.Identifier(table)))
+
+        # One row per comment, keyed by its GitHub id
+        cursor.execute(sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {}.comments (
+            id BIGINT PRIMARY KEY,
+            thread_table VARCHAR(20),
+            number INTEGER,
+            author VARCHAR(255),
+            created_at TIMESTAMP,
+            body TEXT
+        )""").format(sql.Identifier(schema_name)))
+        for name, table, columns in (('comments_thread_idx', 'comments', ('thread_table', 'number')), ('comments_created_at_idx', 'comments', ('created_at',)),
+                                     ('comments_author_idx', 'comments', ('author',)), ('commits_date_idx', 'commits', ('date',)),
+                                     ('commits_author_idx', 'commits', ('author',))):
+            cursor.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {}.{} ({})").format(
+                sql.Identifier(name), sql.Identifier(schema_name), sql.Identifier(table), sql.SQL(', ').join(map(sql.Identifier, columns))))
+    
+    # Create branches table
+    cursor.execute(sql.SQL("""
+    CREATE TABLE IF NOT EXISTS {}.branches (
+        name VARCHAR(255) PRIMARY KEY,
+        sha VARCHAR(255)
+    )""").format(sql.Identifier(schema_name)))
+
+    conn.commit()
+
+# Primary key, written columns and the columns an upsert refreshes (commits and branches are kept as first seen)
+TABLE_COLUMNS = {
+    'commits': ('sha', ('sha', 'message', 'date', 'author'), ()),
+    'issues': ('number', ('number', 'title', 'state', 'creator', 'updated_at', 'comments'), ('title', 'state', 'creator', 'updated_at', 'comments')),
+    'pull_requests': ('number', ('number', 'title', 'state', 'creator', 'updated_at', 'comments'), ('title', 'state', 'creator', 'updated_at', 'comments')),
+    'branches': ('name', ('name', 'sha'), ())
+}
+JSON_COLUMNS = {'comments'}
+
+def insert_rows(conn, schema_name, table, rows, batch_size=1000, layout='jsonb', commit_partitions=None):
+    key, columns, updates = TABLE_COLUMNS[table]
+    normalized = layout == 'normalized' and table in ('issues', 'pull_requests')
+    if normalized:
+        columns = tuple(column for column in columns if column not in JSON_COLUMNS) + ('body', 'created_at')
+        updates = tuple(column for column in updates if column not in JSON_COLUMNS) + ('body', 'created_at')
+    if updates:
+        on_conflict = sql.SQL("({}) DO UPDATE SET {}").format(sql.Identifier(key), sql.SQL(', ').join(
+            sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column)) for column in updates))
+    else:
+        # Without a conflict target this also holds for the (sha, date) key of partitioned commits
+        on_conflict = sql.SQL("DO NOTHING")
+    query = sql.SQL("INSERT INTO {}.{} ({}) VALUES %s ON CONFLICT {}").format(
+        sql.Identifier(schema_name), sql.Identifier(table),
+        sql.SQL(', ').join(map(sql.Identifier, columns)), on_conflict)
+
+    # A row may show up on two pages if the listing shifts mid-run; one statement can't upsert it twice
+    rows = list({row[key]: row for row in rows}.values())
+    if normalized:
+        threads = [dict(row, body=row['comments'][0]['body'], created_at=row['comments'][0]['created_at']) for row in rows]
+        values = [tuple(thread[column] for column in columns) for thread in threads]
+    else:
+        values = [tuple(Json(row[column]) if column in JSON_COLUMNS else row[column] for column in columns) for row in rows]
+
+    start_time = time()
+    cursor = conn.cursor()
+    if table == 'commits' and commit_partitions:
+        create_commit_partitions(cursor, schema_name, rows, commit_partitions)
+    execute_values(cursor, query, values, page_size=batch_size)
+    if normalized:
+        upsert_comments(cursor, schema_name, table, rows, batch_size)
+    conn.commit()
+    return time() - start_time
+
+def upsert_comments(cursor, schema_name, table, rows, batch_size):
+    # Comments after the description are upserted by id. Stored comments missing from a thread's list
+    # are deleted only when the row is marked comments_complete, i.e. every comment page was fetched;
+    # other threads only gain or update comments.
+    comments = {comment['id']: (comment['id'], table, row['number'], comment['user'], comment['created_at'], comment['body'])
+                for row in rows for comment in row['comments'][1:]}
+    complete = [row['number'] for row in rows if row.get('comments_complete')]
+    if complete:
+        cursor.execute(sql.SQL("DELETE FROM {}.comments WHERE thread_table = %s AND number = ANY(%s) AND NOT id = ANY(%s)").format(sql.Identifier(schema_name)),
+                       (table, complete, list(comments)))
+    execute_values(cursor, sql.SQL("""
+    INSERT INTO {}.comments (id, thread_table, number, author, created_at, body) VALUES %s
+    ON CONFLICT (id) DO UPDATE SET thread_table = EXCLUDED.thread_table, number = EXCLUDED.number,
+        author = EXCLUDED.author, created_at = EXCLUDED.created_at, body = EXCLUDED.body""").format(
+        sql.Identifier(schema_name)), list(comments.values()), page_size=batch_size)
+
+def create_commit_partitions(cursor, schema_name, rows, commit_partitions):
+    # Partitions are created on demand for the periods in the batch. A schema whose commits table
+    # was created before partitioning was enabled is left as it is.
+    cursor.execute("""
+    SELECT 1 FROM pg_partitioned_table p
+    JOIN pg_class c ON c.oid = p.partrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = %s AND c.relname = 'commits'""", (schema_name,))
+    if cursor.fetchone() is None:
+        return
+    periods = {row['date'][:4] if commit_partitions == 'year' else row['date'][:7] for row in rows if row['date']}
+    for period in sorted(periods):
+        if commit_partitions == 'year':
+            start, end = f'{period}-01-01', f'{int(period) + 1}-01-01'
+        else:
+            year, month = int(period[:4]), int(period[5:7])
+            start, end = f'{period}-01', f'{year + month // 12}-{month % 12 + 1:02d}-01'
+        cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {}.{} PARTITION OF {}.commits FOR VALUES FROM (%s) TO (%s)").format(
+            sql.Identifier(schema_name), sql.Identifier(f"commits_{period.replace('-', '_')}"), sql.Identifier(schema_name)),
+            (start, end))
+
+def get_high_water_marks(conn, schema_name):
+    # Newest row already stored per table, used as the lower bound of an incremental run
+    cursor = conn.cursor()
+    marks = {}
+    for table, column in (('commits', 'date'), ('issues', 'updated_at'), ('pull_requests', 'updated_at')):
+        cursor.execute(sql.SQL("SELECT MAX({}) FROM {}.{}").format(sql.Identifier(column), sql.Identifier(schema_name), sql.Identifier(table)))
+        mark = cursor.fetchone()[0]
+        marks[table] = mark.strftime('%Y-%m-%dT%H:%M:%SZ') if mark else None
+    return marks
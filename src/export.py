@@ -0,0 +1,122 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import textwrap
+
+class JsonExporter:
+    # Streams records into the same {table: [records]} layout json.dump(indent=4) produces,
+    # spooling each table to a temporary file so nothing is held in memory until the run ends
+    def __init__(self, path, tables):
+        self.path = path
+        self.spools = {table: tempfile.TemporaryFile('w+', encoding='utf-8') for table in tables}
+        self.counts = dict.fromkeys(tables, 0)
+
+    def write(self, table, records):
+        spool = self.spools[table]
+        for record in records:
+            if self.counts[table]:
+                spool.write(',\n')
+            spool.write(textwrap.indent(json.dumps(record, ensure_ascii=False, indent=4), ' ' * 8))
+            self.counts[table] += 1
+
+    def close(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{')
+            for i, (table, spool) in enumerate(self.spools.items()):
+                f.write(',\n' if i else '\n')
+                f.write(f'    {json.dumps(table)}: ')
+                if self.counts[table]:
+                    f.write('[\n')
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, f)
+                    f.write('\n    ]')
+                else:
+                    f.write('[]')
+                spool.close()
+            f.write('\n}' if self.spools else '}')
+
+class NdjsonExporter:
+    # One newline-delimited JSON file per table, appended batch by batch. Each batch is an independent
+    # gzip member / zstd frame, and the optional .idx file records where every batch starts, so readers
+    # can seek straight to a batch and decode it without reading the file from the beginning.
+    def __init__(self, base_path, tables, compression=None, index=False, resume=False):
+        if compression == 'gzip':
+            self.compress = gzip.compress
+        elif compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError("zstd compression requires the 'zstandard' package (pip install zstandard).")
+            self.compress = zstandard.ZstdCompressor().compress
+        elif compression:
+            raise ValueError(f"Unknown export compression: {compression}. Use 'gzip' or 'zstd'.")
+        else:
+            self.compress = None
+
+        suffix = '.ndjson' + {'gzip': '.gz', 'zstd': '.zst'}.get(compression, '')
+        paths = {table: f"{base_path}.{table}{suffix}" for table in tables}
+        # A resumed run appends to what the interrupted run exported; offsets and record numbers carry on
+        self.counts = {table: count_records(paths[table], compression) if resume else 0 for table in tables}
+        mode = 'a' if resume else 'w'
+        self.files = {table: open(paths[table], mode + 'b') for table in tables}
+        self.indexes = {table: open(f"{paths[table]}.idx", mode, encoding='utf-8') for table in tables} if index else {}
+
+    def write(self, table, records):
+        if not records:
+            return
+        data = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records).encode('utf-8')
+        if self.compress:
+            data = self.compress(data)
+        f = self.files[table]
+        offset = f.tell()
+        f.write(data)
+        if table in self.indexes:
+            self.indexes[table].write(json.dumps({
+                'offset': offset,
+                'length': len(data),
+                'first_record': self.counts[table],
+                'records': len(records)
+            }) + '\n')
+        self.counts[table] += len(records)
+
+    def close(self):
+        for f in list(self.files.values()) + list(self.indexes.values()):
+            f.close()
+
+def count_records(path, compression):
+    if not os.path.exists(path):
+        return 0
+    if compression == 'gzip':
+        f = gzip.open(path, 'rb')
+    elif compression == 'zstd':
+        import zstandard
+        f = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True, closefd=True)
+    else:
+        f = open(path, 'rb')
+    with f:
+        count = 0
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            count += chunk.count(b'\n')
+        return count
+
+def resumed_json_path(base_path):
+    # The single JSON file can't be appended to, so a resumed run writes the rows it adds next to it
+    path = f"{base_path}.resumed.json"
+    number = 1
+    while os.path.exists(path):
+        number += 1
+        path = f"{base_path}.resumed-{number}.json"
+    return path
+
+def create_exporter(base_path, tables, export_format='json', compression=None, index=False, resume=False):
+    if export_format == 'json':
+        path = f"{base_path}.json"
+        if resume and os.path.exists(path):
+            path = resumed_json_path(base_path)
+            print(f"Rows exported before the interruption stay in {base_path}.json; this run exports to {path}")
+        return JsonExporter(path, tables)
+    if export_format == 'ndjson':
+        return NdjsonExporter(base_path, tables, compression, index, resume)
+    raise ValueError(f"Unknown export format: {export_format}. Use 'json' or 'ndjson'.")
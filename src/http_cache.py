@@ -0,0 +1,88 @@
+import json
+import sqlite3
+from time import time
+from urllib.parse import urlencode
+
+CACHED_HEADERS = ('Link', 'ETag', 'Last-Modified')
+
+class CacheEntry:
+    __slots__ = ('etag', 'last_modified', 'headers', 'body')
+
+    def __init__(self, etag, last_modified, headers, body):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.headers = headers
+        self.body = body
+
+class HttpCache:
+    # Persistent response cache for conditional requests. Entries are keyed by URL and params and
+    # evicted least-recently-used first once the stored bodies exceed max_bytes.
+    def __init__(self, path, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            headers TEXT,
+            body BLOB,
+            size INTEGER,
+            last_access REAL
+        )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(url, params=None):
+        if not params:
+            return url
+        return f"{url}|{urlencode(sorted((k, str(v)) for k, v in params.items()))}"
+
+    def get(self, key):
+        row = self.conn.execute("SELECT etag, last_modified, headers, body FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(row[0], row[1], json.loads(row[2]), row[3])
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def hit(self, key):
+        self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time(), key))
+
+    def put(self, key, headers, body):
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        kept = {name: headers[name] for name in CACHED_HEADERS if name in headers}
+        old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, etag, last_modified, headers, body, size, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, etag, last_modified, json.dumps(kept), body, len(body), time()))
+        self.total_bytes += len(body) - (old[0] if old else 0)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        # Trim to 90% of the cap so a full cache doesn't evict on every insert
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def close(self):
+        self.conn.close()
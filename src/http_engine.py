@@ -0,0 +1,177 @@
+import asyncio
+import json
+import random
+from time import monotonic
+import aiohttp
+from multidict import CIMultiDict
+from rate_limiter import AdaptiveLimiter
+from metrics import Metrics
+
+try:
+    # Optional: decodes GitHub's large pages several times faster than the json module
+    import orjson
+except ImportError:
+    orjson = None
+
+MAX_RETRIES = 6  # Attempts after a secondary rate limit or server error before giving up on a request
+MAX_BACKOFF = 60  # Seconds; cap for server-error backoff
+
+class HttpError(Exception):
+    def __init__(self, status, url, message, elapsed=0.0):
+        super().__init__(f"{status} {message} for url: {url}" if status else message)
+        self.status = status
+        self.url = url
+        self.elapsed = elapsed
+
+class HttpResponse:
+    __slots__ = ('url', 'status', 'headers', 'body', 'elapsed')
+
+    def __init__(self, url, status, headers, body, elapsed=0.0):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        # Seconds on the wire, not counting the wait for a concurrency slot
+        self.elapsed = elapsed
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise HttpError(self.status, self.url, self.body[:200].decode('utf-8', 'replace'))
+
+    def json(self):
+        return orjson.loads(self.body) if orjson else json.loads(self.body)
+
+class HttpEngine:
+    # One keep-alive connection pool shared by every request of a mining run.
+    # Use it as an async context manager inside the event loop that runs the fetches.
+    def __init__(self, headers, token_pool, concurrency=24, timeout=60, cache=None, metrics=None):
+        self.headers = headers
+        self.token_pool = token_pool
+        self.cache = cache
+        self.metrics = metrics or Metrics()
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session = None
+        self.limiter = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(headers=self.headers, connector=connector, timeout=self.timeout)
+        self.limiter = AdaptiveLimiter(self.concurrency)
+        await self.metrics.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        await self.metrics.stop()
+        self.metrics.close()
+        if self.cache:
+            self.cache.close()
+
+    async def get(self, url, params=None, token_pool=None):
+        return await self.request('GET', url, params=params, token_pool=token_pool)
+
+    async def post(self, url, json_body, token_pool=None):
+        return await self.request('POST', url, json_body=json_body, token_pool=token_pool)
+
+    async def request(self, method, url, params=None, json_body=None, token_pool=None):
+        # token_pool overrides the engine's pool for APIs metered on a separate budget (GraphQL, search)
+        token_pool = token_pool or self.token_pool
+        cache = self.cache if method == 'GET' else None
+        cache_key = cache.key(url, params) if cache else None
+        cached = cache.get(cache_key) if cache else None
+        request_headers = cache.conditional_headers(cached) if cached else None
+
+        attempt = 0
+        while True:
+            token = await token_pool.acquire()
+            try:
+                response = await self._send(method, url, params, json_body, token.auth, request_headers)
+            except HttpError as e:
+                self.metrics.request(method, url, None, e.elapsed, 0, token.index + 1, attempt=attempt)
+                if attempt >= MAX_RETRIES:
+                    raise
+                # Dropped connections (often a reused keep-alive connection the server had closed) and
+                # timeouts are retried with the same backoff as server errors
+                delay = min(MAX_BACKOFF, 2 ** attempt) * random.uniform(0.5, 1)
+                self.metrics.retry(url, 'transport_error', delay)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            token_pool.update(token, response.headers)
+            remaining = response.headers.get('X-RateLimit-Remaining')
+            self.metrics.request(method, url, response.status, response.elapsed, len(response.body), token.index + 1,
+                                 int(remaining) if remaining else None, response.headers.get('X-RateLimit-Resource'),
+                                 response.status == 304, attempt)
+            if is_quota_exhausted(response):
+                # Quota exhausted: the pool waits for a reset if no other token has headroom
+                token_pool.exhaust(token, int(response.headers.get('X-RateLimit-Reset', 0)))
+                self.metrics.retry(url, 'quota')
+                continue
+            if attempt >= MAX_RETRIES:
+                break
+            if is_secondary_limit(response):
+                # Secondary limits are per user, not per token, so every request pauses instead of rotating tokens
+                delay = retry_after(response) or 60 * 2 ** attempt
+                self.metrics.retry(url, 'secondary_limit', delay)
+                self.limiter.pause(delay + random.random())
+            elif response.status in (500, 502, 503, 504):
+                delay = (retry_after(response) or min(MAX_BACKOFF, 2 ** attempt)) * random.uniform(0.5, 1)
+                self.metrics.retry(url, 'server_error', delay)
+                await asyncio.sleep(delay)
+            else:
+                break
+            attempt += 1
+
+        if cache:
+            if response.status == 304 and cached:
+                # Unchanged since the last run: GitHub doesn't charge quota for a 304
+                cache.hit(cache_key)
+                headers = CIMultiDict(response.headers)
+                headers.update(cached.headers)
+                return HttpResponse(response.url, 200, headers, cached.body, response.elapsed)
+            if response.status == 200:
+                self.metrics.cache_miss(url)
+                cache.put(cache_key, response.headers, response.body)
+        return response
+
+    async def _send(self, method, url, params, json_body, auth, request_headers=None):
+        await self.limiter.acquire()
+        healthy = False
+        start_time = monotonic()
+        try:
+            async with self.session.request(method, url, params=params, json=json_body, auth=aiohttp.BasicAuth(*auth), headers=request_headers) as response:
+                body = await response.read()
+                response = HttpResponse(str(response.url), response.status, response.headers, body, monotonic() - start_time)
+                # Quota exhaustion is handled by the token pool; only congestion lowers the limit
+                healthy = not (is_secondary_limit(response) or response.status in (500, 502, 503, 504))
+                return response
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if isinstance(e, aiohttp.ServerDisconnectedError):
+                # A stale keep-alive connection, not a sign of load
+                healthy = None
+            raise HttpError(None, url, str(e) or type(e).__name__, monotonic() - start_time)
+        except asyncio.CancelledError:
+            # Cancelled by the caller (Stop, an early close or a failed write), which says nothing about GitHub's load
+            healthy = None
+            raise
+        finally:
+            await self.limiter.release(healthy)
+
+def is_quota_exhausted(response):
+    return response.status in (403, 429) and response.headers.get('X-RateLimit-Remaining') == '0'
+
+def is_secondary_limit(response):
+    # GitHub answers secondary (abuse) limits with 403/429 while the token still has quota left,
+    # usually with a Retry-After header and a message naming the limit
+    if response.status not in (403, 429) or is_quota_exhausted(response):
+        return False
+    message = response.body[:1000].lower()
+    return (response.status == 429 or 'Retry-After' in response.headers
+            or b'secondary rate limit' in message or b'abuse' in message)
+
+def retry_after(response):
+    try:
+        return int(response.headers.get('Retry-After', 0))
+    except ValueError:
+        return 0
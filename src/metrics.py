@@ -0,0 +1,156 @@
+import json
+import threading
+from collections import defaultdict
+from time import time
+from urllib.parse import urlparse
+from aiohttp import web
+
+def endpoint_name(url):
+    # Collapse repository names and numbers so every issue's comments count as one endpoint
+    parts = urlparse(url).path.strip('/').split('/')
+    if parts[0] == 'repos' and len(parts) >= 3:
+        parts[1:3] = [':owner', ':repo']
+    return '/' + '/'.join(':number' if part.isdigit() else part for part in parts)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+class Metrics:
+    # Counters for one engine's lifetime. Every request and database write is recorded here;
+    # when log_path is set each one is also appended to a JSON-lines file, and when port is set
+    # the counters are served in the Prometheus text format at http://127.0.0.1:<port>/metrics.
+    def __init__(self, log_path=None, port=None):
+        self.started = time()
+        self.log = open(log_path, 'a', encoding='utf-8') if log_path else None
+        self.port = port
+        self.runner = None
+        # Database writes are recorded from worker threads
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.gauges = {}
+
+    def emit(self, event, **fields):
+        if self.log:
+            line = json.dumps(dict(ts=round(time(), 3), event=event, **fields)) + '\n'
+            with self.lock:
+                self.log.write(line)
+
+    def increment(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def request(self, method, url, status, elapsed, size, token=None, remaining=None, resource=None, cached=False, attempt=0):
+        endpoint = endpoint_name(url)
+        status = str(status or 'error')
+        self.increment('http_requests_total', endpoint=endpoint, status=status)
+        self.increment('http_request_seconds_sum', elapsed, endpoint=endpoint)
+        self.increment('http_response_bytes_total', size, endpoint=endpoint)
+        if cached:
+            self.increment('http_cache_hits_total', endpoint=endpoint)
+        with self.lock:
+            key = ('http_request_seconds_max', (('endpoint', endpoint),))
+            self.gauges[key] = max(self.gauges.get(key, 0), elapsed)
+            if token is not None and remaining is not None:
+                # REST, search and GraphQL quotas are separate budgets of the same token
+                self.gauges[('token_remaining', (('resource', resource or 'core'), ('token', str(token))))] = remaining
+        self.emit('request', method=method, endpoint=endpoint, url=url, status=status, elapsed_ms=round(elapsed * 1000, 1),
+                  bytes=size, token=token, resource=resource, remaining=remaining, cached=cached, attempt=attempt)
+
+    def cache_miss(self, url):
+        # A cached GET that came back changed, or one with nothing cached yet
+        self.increment('http_cache_misses_total', endpoint=endpoint_name(url))
+
+    def retry(self, url, reason, delay=0):
+        self.increment('http_retries_total', reason=reason)
+        self.emit('retry', endpoint=endpoint_name(url), url=url, reason=reason, delay_s=round(delay, 2))
+
+    def db_write(self, table, rows, elapsed):
+        self.increment('rows_written_total', rows, table=table)
+        self.increment('db_write_seconds_sum', elapsed, table=table)
+        self.increment('db_batches_total', table=table)
+        self.emit('db_write', table=table, rows=rows, elapsed_ms=round(elapsed * 1000, 1))
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+        with self.lock:
+            samples = sorted(self.counters.items()) + sorted(self.gauges.items())
+        typed = set()
+        for (name, labels), value in samples:
+            metric = f'miner_{name}'
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} {'counter' if name.endswith(('_total', '_sum')) else 'gauge'}")
+            lines.append(f'{metric}{format_labels(labels)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+        elapsed = time() - self.started
+        endpoints = defaultdict(lambda: {'requests': 0, 'errors': 0, 'seconds': 0.0, 'bytes': 0, 'cached': 0})
+        for (name, labels), value in counters.items():
+            labels = dict(labels)
+            if 'endpoint' not in labels:
+                continue
+            stats = endpoints[labels['endpoint']]
+            if name == 'http_requests_total':
+                stats['requests'] += value
+                if labels['status'] == 'error' or int(labels['status']) >= 400:
+                    stats['errors'] += value
+            elif name == 'http_request_seconds_sum':
+                stats['seconds'] += value
+            elif name == 'http_response_bytes_total':
+                stats['bytes'] += value
+            elif name == 'http_cache_hits_total':
+                stats['cached'] += value
+
+        lines = [f"Run metrics ({elapsed:.1f}s):"]
+        for endpoint, stats in sorted(endpoints.items(), key=lambda item: -item[1]['seconds']):
+            slowest = gauges.get(('http_request_seconds_max', (('endpoint', endpoint),)), 0)
+            lines.append(f"  {endpoint}: {stats['requests']:.0f} requests ({stats['errors']:.0f} failed, {stats['cached']:.0f} cached), "
+                         f"avg {stats['seconds'] / max(stats['requests'], 1) * 1000:.0f} ms, max {slowest * 1000:.0f} ms, {stats['bytes'] / 1048576:.1f} MB")
+        hits = sum(value for (name, _), value in counters.items() if name == 'http_cache_hits_total')
+        misses = sum(value for (name, _), value in counters.items() if name == 'http_cache_misses_total')
+        if hits or misses:
+            lines.append(f"  HTTP cache: {hits:.0f} hits, {misses:.0f} misses")
+        for (name, labels), value in sorted(counters.items()):
+            if name == 'http_retries_total':
+                lines.append(f"  retries ({dict(labels)['reason']}): {value:.0f}")
+            elif name == 'rows_written_total':
+                table = dict(labels)['table']
+                seconds = counters.get(('db_write_seconds_sum', labels), 0)
+                lines.append(f"  {table}: {value:.0f} rows written in {seconds:.2f}s")
+        for (name, labels), value in sorted(gauges.items()):
+            if name == 'token_remaining':
+                labels = dict(labels)
+                lines.append(f"  token {labels['token']} ({labels['resource']}): {value} requests remaining")
+        return '\n'.join(lines)
+
+    async def start(self):
+        if not self.port:
+            return
+        async def handle(request):
+            return web.Response(text=self.render(), content_type='text/plain')
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, '127.0.0.1', self.port).start()
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def close(self):
+        if self.log:
+            self.emit('summary', counters=[{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in sorted(self.counters.items())])
+            self.log.close()
+            self.log = None
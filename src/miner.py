@@ -0,0 +1,655 @@
+import asyncio
+import contextvars
+import os
+import random
+from collections import defaultdict
+from functools import partial
+from tqdm.auto import tqdm
+from urllib.parse import urlparse, parse_qs
+from datetime import datetime, timedelta
+from http_engine import HttpEngine, HttpError, MAX_RETRIES, MAX_BACKOFF
+from token_pool import TokenPool
+from pipeline import run_pipeline
+from export import create_exporter
+from http_cache import HttpCache
+from metrics import Metrics
+from checkpoint import Journal
+from database import get_schema_name, create_schema_and_tables, insert_rows, get_high_water_marks
+
+# Configuration comes from the environment; the entry points load .env before importing this module
+
+# Define request headers; authentication comes from the token pool
+headers = {
+    'Accept': 'application/vnd.github.v3+json'
+}
+
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com').rstrip('/')  # Lets the benchmarks point the miner at a local mock server
+LOW_LIMIT_THRESHOLD = 100  # Remaining quota under which a token is rested until its reset
+MAX_CONCURRENCY = int(os.getenv('MAX_CONCURRENCY', 24))  # Requests in flight over the shared connection pool
+HTTP_CACHE_PATH = os.getenv('HTTP_CACHE_PATH', 'http_cache.sqlite')  # Empty to disable conditional requests
+HTTP_CACHE_MAX_MB = int(os.getenv('HTTP_CACHE_MAX_MB', 512))
+DB_BATCH_SIZE = int(os.getenv('DB_BATCH_SIZE', 1000))  # Rows sent per multi-row INSERT
+EXPORT_FORMAT = os.getenv('EXPORT_FORMAT', 'json')  # 'json' (single file) or 'ndjson' (one file per table)
+EXPORT_COMPRESSION = os.getenv('EXPORT_COMPRESSION') or None  # ndjson only: 'gzip' or 'zstd'
+EXPORT_INDEX = os.getenv('EXPORT_INDEX', '0') == '1'  # ndjson only: write a byte-offset index per file
+API_BACKEND = os.getenv('API_BACKEND', 'rest')  # 'graphql' fetches issues and PRs together with their comments
+JOURNAL_PATH = os.getenv('JOURNAL_PATH', 'mining_journal.sqlite')  # Empty to disable checkpoint/resume
+COMMENTS_MODE = os.getenv('COMMENTS_MODE', 'threads')  # 'bulk' reads every comment of the range from /issues/comments in one pass
+SHOW_PROGRESS = os.getenv('SHOW_PROGRESS', '1') == '1'  # One progress bar per stage; 0 for logs and batch jobs
+METRICS_LOG = os.getenv('METRICS_LOG') or None  # JSON-lines file receiving one event per request and database write
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0)) or None  # Serve Prometheus metrics on http://127.0.0.1:<port>/metrics
+STORAGE_LAYOUT = os.getenv('STORAGE_LAYOUT', 'jsonb')  # 'normalized' stores comments in an indexed table instead of a JSONB column
+COMMITS_PARTITION = os.getenv('COMMITS_PARTITION') or None  # 'year' or 'month' range-partitions new commits tables by date
+
+ENTITY_LABELS = {'commits': 'Commits', 'issues': 'Issues', 'pull_requests': 'Pull Requests', 'branches': 'Branches'}
+
+# Shared by every run so quota knowledge carries over between runs; built by the first
+# create_engine call so importing the module reads no credentials
+token_pool = None
+# GraphQL is metered on its own hourly budget, separate from the REST quota
+graphql_token_pool = None
+# So is search, on a budget of 30 requests per minute
+search_token_pool = None
+
+# Control variable to stop the process
+stop_process = False
+
+# Fetch failures of the current mining run. mine_repository gives each run its own list, which the
+# tasks it starts share, so runs of a batch sharing one engine don't see each other's failures.
+run_failures = contextvars.ContextVar('run_failures', default=None)
+
+class IncompleteRunError(Exception):
+    # Raised once a run has written everything it could fetch while some requests failed for good
+    def __init__(self, message, stats):
+        super().__init__(message)
+        self.stats = stats
+
+def report_failure(message):
+    print(message)
+    failures = run_failures.get()
+    if failures is not None:
+        failures.append(message)
+
+def get_repo_name(repo_url):
+    try:
+        path = urlparse(repo_url).path
+        repo_name = path.lstrip('/')
+        if len(repo_name.split('/')) != 2:
+            raise ValueError("Invalid repository URL. Make sure it is in the format 'https://github.com/owner/repo'.")
+        return repo_name
+    except Exception as e:
+        raise ValueError("Error parsing repository URL. Check the format and try again.")
+
+def parse_links(link_header):
+    links = {}
+    for link in link_header.split(','):
+        if 'rel="' in link:
+            target, rel = link.split(';', 1)
+            links[rel.split('"')[1]] = target.strip()[1:-1]
+    return links
+
+async def iter_pages(engine, url, desc, params=None, done=frozenset(), project=None, strict=False):
+    # Yields (page number, items) for every page fetched successfully. Pages in done were committed by
+    # an interrupted run and are not yielded again; only page 1 is refetched, for its Link header.
+    # With strict, a page that can't be fetched raises instead of being skipped.
+    global stop_process
+    found = False
+
+    def check(data, page):
+        if data is None and strict:
+            raise RuntimeError(f"Could not fetch page {page} of {url}")
+
+    # The first real page tells how many more there are, so no separate probe request is needed
+    params = dict(params or {}, per_page=100)
+    data, links = await fetch_page_data(engine, url, dict(params, page=1), project)
+    check(data, 1)
+    total_pages = int(parse_qs(urlparse(links['last']).query)['page'][0]) if 'last' in links else None
+
+    # Only a window of pages is in flight, so a slow consumer holds back fetching instead of piling up pages
+    window = engine.concurrency * 2
+    pending = {}
+    with tqdm(total=total_pages or 1, desc=desc, unit="page", disable=not SHOW_PROGRESS) as pbar:
+        pbar.update(1)
+        if data is not None and 1 not in done:
+            found = found or bool(data)
+            yield 1, data
+
+        if total_pages is None:
+            # Endpoints without a rel="last" link can only be walked one rel="next" at a time
+            page = 1
+            while 'next' in links and not stop_process:
+                page += 1
+                data, links = await fetch_page_data(engine, links['next'], None, project)
+                check(data, page)
+                pbar.total += 1
+                pbar.update(1)
+                if data is not None and page not in done:
+                    found = found or bool(data)
+                    yield page, data
+        else:
+            remaining = iter([page for page in range(2, total_pages + 1) if page not in done])
+            pbar.update(sum(1 for page in done if 1 < page <= total_pages))
+            next_page = next(remaining, None)
+            try:
+                while pending or (next_page is not None and not stop_process):
+                    while next_page is not None and len(pending) < window and not stop_process:
+                        pending[asyncio.ensure_future(fetch_page_data(engine, url, dict(params, page=next_page), project))] = next_page
+                        next_page = next(remaining, None)
+                    finished, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in finished:
+                        page = pending.pop(task)
+                        pbar.update(1)
+                        try:
+                            data, _ = task.result()
+                        except Exception as e:
+                            report_failure(f"Error fetching page data: {str(e)}")
+                            data = None
+                        check(data, page)
+                        if data is not None:
+                            found = found or bool(data)
+                            yield page, data
+            finally:
+                for task in pending:
+                    task.cancel()
+
+    if stop_process:
+        print("Process stopped by the user.")
+
+    if not found:
+        print(f'No data found for {desc} in the given date range.')
+
+async def fetch_page_data(engine, url, params=None, project=None):
+    try:
+        response = await engine.get(url, params=params)
+        response.raise_for_status()
+    except HttpError as e:
+        report_failure(f"Error fetching data from URL: {url} - {str(e)}")
+        return None, {}
+
+    # Projecting right after decoding keeps only the fields the tables need; the full payloads,
+    # with their urls, user objects and reactions, are dropped before the page is queued
+    data = response.json()
+    return project(data) if project else data, parse_links(response.headers.get('Link', ''))
+
+def thread_key(number, updated_at):
+    # Journal entry for an issue/PR thread; a later update gives it a new key, so it is mined again
+    return f"{number}@{updated_at}"
+
+def project_comments(comments):
+    return [{
+        'id': comment['id'],
+        'user': comment['user']['login'],
+        'body': comment['body'],
+        'created_at': comment['created_at']
+    } for comment in comments if 'id' in comment and comment.get('user') and 'login' in comment['user'] and 'body' in comment and 'created_at' in comment]
+
+async def get_thread_comments(engine, threads):
+    # Every comment page of a batch of threads is requested at once and the engine's limiter bounds
+    # how many are in flight. The comments count on each thread gives the number of pages, so
+    # silent threads cost no request and no thread needs a probe.
+    page_counts = [-(-thread['comments'] // 100) for thread in threads]
+    requests = [(index, page) for index, count in enumerate(page_counts) for page in range(1, count + 1)]
+    results = await asyncio.gather(*(fetch_page_data(engine, threads[index]['comments_url'], {'per_page': 100, 'page': page}, project_comments)
+                                     for index, page in requests))
+
+    # A thread with a page that failed gets None instead of a partial list, so it is not stored
+    comments = [[] for _ in threads]
+    for (index, page), (data, links) in zip(requests, results):
+        # The count can lag behind comments posted since; the last page links to any extra ones
+        while data is not None and comments[index] is not None:
+            comments[index].extend(data)
+            if page != page_counts[index] or 'next' not in links:
+                break
+            data, links = await fetch_page_data(engine, links['next'], None, project_comments)
+        if data is None:
+            comments[index] = None
+    return comments
+
+def project_repository_comments(comments):
+    # Each comment is checked and projected on its own, so a skipped one can't shift the others onto another thread
+    return [(int(comment['issue_url'].rsplit('/', 1)[1]), {
+        'id': comment['id'],
+        'user': comment['user']['login'],
+        'body': comment['body'],
+        'created_at': comment['created_at']
+    }) for comment in comments if 'issue_url' in comment and 'id' in comment and comment.get('user') and 'login' in comment['user'] and 'body' in comment and 'created_at' in comment]
+
+async def get_repository_comments(engine, repo_name, start_date):
+    # One pass over the repository's comment listing covers every issue and PR at once. A thread
+    # created in the range only has comments from the range on, so start_date bounds the listing.
+    url = f'{GITHUB_API_URL}/repos/{repo_name}/issues/comments'
+    pages = defaultdict(list)
+    # Any page missing would silently strip comments from the threads on it, so a failed page fails the stage
+    async for page, data in iter_pages(engine, url, 'Fetching comments', {'since': start_date[:10] + 'T00:00:00Z', 'sort': 'created', 'direction': 'asc'},
+                                       project=project_repository_comments, strict=True):
+        for number, comment in data:
+            pages[number].append((page, comment))
+    # Pages arrive out of order; the listing itself is in creation order
+    return {number: [comment for _, comment in sorted(thread_pages, key=lambda item: item[0])] for number, thread_pages in pages.items()}
+
+def project_commits(commits):
+    return [{
+        'sha': commit['sha'],
+        'message': commit['commit']['message'],
+        'date': commit['commit']['author']['date'],
+        'author': commit['commit']['author']['name']
+    } for commit in commits if 'sha' in commit and 'commit' in commit and 'message' in commit['commit'] and 'author' in commit['commit'] and 'date' in commit['commit']['author'] and 'name' in commit['commit']['author']]
+
+async def get_commits(engine, repo_name, start_date, end_date, since=None, done=frozenset()):
+    url = f'{GITHUB_API_URL}/repos/{repo_name}/commits'
+    params = {
+        'since': since or start_date,
+        'until': end_date
+    }
+    async for page, commits in iter_pages(engine, url, 'Fetching commits', params, done={int(item) for item in done}, project=project_commits):
+        yield commits, [str(page)]
+
+SEARCH_URL = f'{GITHUB_API_URL}/search/issues'
+SEARCH_MAX_RESULTS = 1000  # Search returns at most this many results per query, in pages of 100
+
+def project_threads(threads):
+    return [{
+        'number': thread['number'],
+        'title': thread['title'],
+        'state': thread['state'],
+        'creator': thread['user']['login'],
+        'body': thread.get('body'),
+        'created_at': thread['created_at'],
+        'updated_at': thread['updated_at'],
+        'comments_url': thread['comments_url'],
+        'comments': thread.get('comments', 0)
+    } for thread in threads if 'number' in thread and 'title' in thread and 'state' in thread and thread.get('user') and 'login' in thread['user']]
+
+def format_timestamp(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+async def fetch_search_page(engine, query, start, end, page):
+    params = {
+        'q': f'{query} created:{format_timestamp(start)}..{format_timestamp(end)}',
+        'sort': 'created',
+        'order': 'asc',
+        'per_page': 100,
+        'page': page
+    }
+    try:
+        response = await engine.get(SEARCH_URL, params, search_token_pool)
+        response.raise_for_status()
+    except HttpError as e:
+        report_failure(f"Error fetching data from URL: {SEARCH_URL} - {str(e)}")
+        return None
+    data = response.json()
+    data['items'] = project_threads(data['items'])
+    return data
+
+async def search_partitions(engine, query, start, end):
+    # Halves the created-date window until every part fits in one search query. The halves are
+    # split concurrently, and each part keeps its first page so it is not requested twice.
+    data = await fetch_search_page(engine, query, start, end, 1)
+    if data is None:
+        return []
+    if data['total_count'] > SEARCH_MAX_RESULTS and end - start > timedelta(minutes=1):
+        middle = start + (end - start) / 2
+        halves = await asyncio.gather(search_partitions(engine, query, start, middle),
+                                      search_partitions(engine, query, middle + timedelta(seconds=1), end))
+        return halves[0] + halves[1]
+    if data.get('incomplete_results') or data['total_count'] > SEARCH_MAX_RESULTS:
+        print(f"Search results for {format_timestamp(start)}..{format_timestamp(end)} are incomplete; some items may be missing.")
+    return [(start, end, data)]
+
+async def iter_search(engine, query, start_date, end_date, desc):
+    # Yields pages of issues/PRs created within the range; the date window is applied by GitHub,
+    # so only matching items are downloaded
+    global stop_process
+    # The range covers whole days, as the GraphQL backend compares them, so the window starts at
+    # midnight rather than at the one-second offset the commits listing uses
+    start = datetime.strptime(start_date[:10], '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%dT%H:%M:%SZ')
+    partitions = await search_partitions(engine, query, start, end)
+
+    found = False
+    pages = [(start, end, page) for start, end, data in partitions
+             for page in range(2, -(-min(data['total_count'], SEARCH_MAX_RESULTS) // 100) + 1)]
+    with tqdm(total=len(partitions) + len(pages), desc=desc, unit="page", disable=not SHOW_PROGRESS) as pbar:
+        for _, _, data in partitions:
+            pbar.update(1)
+            found = found or bool(data['items'])
+            yield data['items']
+
+        # The remaining pages of every partition are fetched in parallel, a window at a time as in iter_pages
+        window = engine.concurrency * 2
+        pending = set()
+        remaining = iter(pages)
+        next_page = next(remaining, None)
+        try:
+            while pending or (next_page is not None and not stop_process):
+                while next_page is not None and len(pending) < window and not stop_process:
+                    pending.add(asyncio.ensure_future(fetch_search_page(engine, query, *next_page)))
+                    next_page = next(remaining, None)
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    pbar.update(1)
+                    try:
+                        data = task.result()
+                    except Exception as e:
+                        report_failure(f"Error fetching search page: {str(e)}")
+                        data = None
+                    if data is not None:
+                        found = found or bool(data['items'])
+                        yield data['items']
+        finally:
+            for task in pending:
+                task.cancel()
+
+    if stop_process:
+        print("Process stopped by the user.")
+
+    if not found:
+        print(f'No data found for {desc} in the given date range.')
+
+async def iter_search_threads(engine, repo_name, kind, start_date, end_date, since, done, desc, bulk_comments=None):
+    query = f'repo:{repo_name} is:{kind}'
+    if since:
+        # An incremental run only needs threads updated since the last one
+        query += f' updated:>={since}'
+    async for threads in iter_search(engine, query, start_date, end_date, desc):
+        # Threads an interrupted run already committed are skipped unless they changed since
+        threads = [thread for thread in threads if thread_key(thread['number'], thread['updated_at']) not in done]
+        if bulk_comments is not None:
+            comments_by_thread = await bulk_comments
+            comments = [comments_by_thread.get(thread['number'], []) for thread in threads]
+        else:
+            comments = await get_thread_comments(engine, threads)
+            # A thread missing some of its comments is neither stored nor checkpointed; the failure
+            # keeps the journal, so a rerun fetches it again
+            threads, comments = [thread for thread, thread_comments in zip(threads, comments) if thread_comments is not None], \
+                                [thread_comments for thread_comments in comments if thread_comments is not None]
+        yield [{
+            'number': thread['number'],
+            'title': thread['title'],
+            'state': thread['state'],
+            'creator': thread['creator'],
+            'updated_at': thread['updated_at'],
+            # The description is stored as the first comment
+            'comments': [{
+                'user': thread['creator'],
+                'body': thread['body'],
+                'created_at': thread['created_at']
+            }] + thread_comments,
+            # Threads with a failed comment page were dropped above and bulk mode fails outright,
+            # so every list here is whole and stored comments missing from it can be deleted
+            'comments_complete': True
+        } for thread, thread_comments in zip(threads, comments)], [thread_key(thread['number'], thread['updated_at']) for thread in threads]
+
+async def get_issues(engine, repo_name, start_date, end_date, since=None, done=frozenset(), bulk_comments=None):
+    # Search tells issues and pull requests apart, which /issues does not
+    async for batch in iter_search_threads(engine, repo_name, 'issue', start_date, end_date, since, done, 'Fetching issues', bulk_comments):
+        yield batch
+
+async def get_pull_requests(engine, repo_name, start_date, end_date, since=None, done=frozenset(), bulk_comments=None):
+    async for batch in iter_search_threads(engine, repo_name, 'pr', start_date, end_date, since, done, 'Fetching pull requests', bulk_comments):
+        yield batch
+
+def project_branches(branches):
+    return [{
+        'name': branch['name'],
+        'sha': branch['commit']['sha']
+    } for branch in branches if 'name' in branch and 'commit' in branch and 'sha' in branch['commit']]
+
+async def get_branches(engine, repo_name, done=frozenset()):
+    url = f'{GITHUB_API_URL}/repos/{repo_name}/branches'
+    async for page, branches in iter_pages(engine, url, 'Fetching branches', done={int(item) for item in done}, project=project_branches):
+        yield branches, [str(page)]
+
+GRAPHQL_URL = f'{GITHUB_API_URL}/graphql'
+
+COMMENT_FIELDS = """
+    pageInfo { hasNextPage endCursor }
+    nodes { databaseId author { login } body createdAt }
+"""
+
+THREAD_FIELDS = """
+    pageInfo { hasNextPage endCursor }
+    nodes {
+        number title state body createdAt updatedAt
+        author { login }
+        comments(first: 100) {""" + COMMENT_FIELDS + """}
+    }
+"""
+
+ISSUES_QUERY = """
+query($owner: String!, $name: String!, $cursor: String, $since: DateTime) {
+    repository(owner: $owner, name: $name) {
+        threads: issues(first: 100, after: $cursor, orderBy: {field: CREATED_AT, direction: DESC}, filterBy: {since: $since}) {""" + THREAD_FIELDS + """}
+    }
+}
+"""
+
+PULL_REQUESTS_QUERY = """
+query($owner: String!, $name: String!, $cursor: String) {
+    repository(owner: $owner, name: $name) {
+        threads: pullRequests(first: 100, after: $cursor, orderBy: {field: CREATED_AT, direction: DESC}) {""" + THREAD_FIELDS + """}
+    }
+}
+"""
+
+COMMENTS_QUERY = """
+query($owner: String!, $name: String!, $number: Int!, $cursor: String) {
+    repository(owner: $owner, name: $name) {
+        issueOrPullRequest(number: $number) {
+            ... on Issue { comments(first: 100, after: $cursor) {""" + COMMENT_FIELDS + """} }
+            ... on PullRequest { comments(first: 100, after: $cursor) {""" + COMMENT_FIELDS + """} }
+        }
+    }
+}
+"""
+
+async def graphql_query(engine, query, variables):
+    for attempt in range(MAX_RETRIES + 1):
+        response = await engine.post(GRAPHQL_URL, {'query': query, 'variables': variables}, graphql_token_pool)
+        response.raise_for_status()
+        payload = response.json()
+        errors = payload.get('errors')
+        if not errors:
+            return payload['data']
+        if not any(error.get('type') == 'RATE_LIMITED' for error in errors):
+            raise Exception(f"GraphQL error: {errors[0].get('message')}")
+        # When X-RateLimit-Remaining hit 0 the pool already waits or switches tokens; a secondary limit
+        # doesn't touch it, so back off like the engine does for 5xx
+        if attempt < MAX_RETRIES:
+            delay = min(MAX_BACKOFF, 2 ** attempt) * random.uniform(0.5, 1)
+            engine.metrics.retry(GRAPHQL_URL, 'graphql_rate_limited', delay)
+            await asyncio.sleep(delay)
+    raise Exception(f"GraphQL error: still rate limited after {MAX_RETRIES} retries")
+
+def graphql_login(author):
+    # Deleted accounts come back as a null author; REST reports them as "ghost"
+    return author['login'] if author else 'ghost'
+
+async def graphql_thread(engine, owner, name, node):
+    comments = node['comments']['nodes']
+    page_info = node['comments']['pageInfo']
+    # Only threads with more than 100 comments need follow-up requests
+    while page_info['hasNextPage']:
+        data = await graphql_query(engine, COMMENTS_QUERY, {'owner': owner, 'name': name, 'number': node['number'], 'cursor': page_info['endCursor']})
+        connection = data['repository']['issueOrPullRequest']['comments']
+        comments.extend(connection['nodes'])
+        page_info = connection['pageInfo']
+
+    essential_comments = [{
+        'user': graphql_login(node['author']),
+        'body': node['body'],
+        'created_at': node['createdAt']
+    }]
+    essential_comments.extend([{
+        'id': comment['databaseId'],
+        'user': graphql_login(comment['author']),
+        'body': comment['body'],
+        'created_at': comment['createdAt']
+    } for comment in comments])
+    return {
+        'number': node['number'],
+        'title': node['title'],
+        # REST reports merged pull requests as closed
+        'state': 'closed' if node['state'] == 'MERGED' else node['state'].lower(),
+        'creator': graphql_login(node['author']),
+        'updated_at': node['updatedAt'],
+        'comments': essential_comments,
+        'comments_complete': True
+    }
+
+async def iter_graphql_threads(engine, repo_name, query, desc, start_date, end_date, variables=None, since=None, done=frozenset()):
+    global stop_process
+    owner, name = repo_name.split('/')
+    start, end = start_date[:10], end_date[:10]
+    cursor = None
+
+    with tqdm(desc=desc, unit="page", disable=not SHOW_PROGRESS) as pbar:
+        while not stop_process:
+            # A failed page or comment query fails the stage rather than cutting the walk short; the
+            # journal keeps what was committed, so the next run resumes from there
+            data = await graphql_query(engine, query, dict(variables or {}, owner=owner, name=name, cursor=cursor))
+            if data['repository'] is None:
+                raise ValueError(f"Repository {repo_name} not found.")
+            page = data['repository']['threads']
+            pbar.update(1)
+
+            nodes = [node for node in page['nodes'] if start <= node['createdAt'][:10] <= end]
+            if since:
+                nodes = [node for node in nodes if node['updatedAt'] >= since]
+            nodes = [node for node in nodes if thread_key(node['number'], node['updatedAt']) not in done]
+            tasks = [asyncio.ensure_future(graphql_thread(engine, owner, name, node)) for node in nodes]
+            try:
+                threads = await asyncio.gather(*tasks)
+            finally:
+                # gather leaves the other threads' queries running when one of them fails
+                for task in tasks:
+                    task.cancel()
+            yield threads, [thread_key(node['number'], node['updatedAt']) for node in nodes]
+
+            # Threads come newest first, so once a page reaches past the start date the rest are older
+            if not page['pageInfo']['hasNextPage'] or (page['nodes'] and page['nodes'][-1]['createdAt'][:10] < start):
+                break
+            cursor = page['pageInfo']['endCursor']
+
+    if stop_process:
+        print("Process stopped by the user.")
+
+async def get_issues_graphql(engine, repo_name, start_date, end_date, since=None, done=frozenset()):
+    async for batch in iter_graphql_threads(engine, repo_name, ISSUES_QUERY, 'Fetching issues (GraphQL)', start_date, end_date, {'since': since}, done=done):
+        yield batch
+
+async def get_pull_requests_graphql(engine, repo_name, start_date, end_date, since=None, done=frozenset()):
+    async for batch in iter_graphql_threads(engine, repo_name, PULL_REQUESTS_QUERY, 'Fetching pull requests (GraphQL)', start_date, end_date, since=since, done=done):
+        yield batch
+
+def create_token_pools():
+    global token_pool, graphql_token_pool, search_token_pool
+    tokens = [token for token in os.getenv('TOKENS', '').split(',') if token]
+    usernames = os.getenv('USERNAMES', '').split(',')
+    if not tokens:
+        raise ValueError("No GitHub tokens configured. Set TOKENS and USERNAMES in the .env file.")
+    token_pool = TokenPool(usernames, tokens, LOW_LIMIT_THRESHOLD)
+    graphql_token_pool = TokenPool(usernames, tokens, LOW_LIMIT_THRESHOLD)
+    # The search budget is too small to keep a reserve; its window resets every minute
+    search_token_pool = TokenPool(usernames, tokens, 1)
+
+def create_engine(concurrency=MAX_CONCURRENCY):
+    if token_pool is None:
+        create_token_pools()
+    cache = HttpCache(HTTP_CACHE_PATH, HTTP_CACHE_MAX_MB * 1024 * 1024) if HTTP_CACHE_PATH else None
+    return HttpEngine(headers, token_pool, concurrency, cache=cache, metrics=Metrics(METRICS_LOG, METRICS_PORT))
+
+def export_record(thread):
+    # Comment ids and the completeness flag are kept in the database only; the exports keep their original layout
+    record = {key: value for key, value in thread.items() if key != 'comments_complete'}
+    return dict(record, comments=[{key: value for key, value in comment.items() if key != 'id'} for comment in thread['comments']])
+
+async def mine_repository(engine, conn, repo_name, start_date, end_date, tables, incremental=False):
+    loop = asyncio.get_running_loop()
+    schema_name = get_schema_name(repo_name)
+    await loop.run_in_executor(None, create_schema_and_tables, conn, repo_name, STORAGE_LAYOUT, COMMITS_PARTITION)
+
+    # Convert dates to ISO 8601 format with the required time adjustments
+    start_date_iso = start_date.strftime('%Y-%m-%d') + 'T00:00:01Z'
+    end_date_iso = end_date.strftime('%Y-%m-%d') + 'T23:59:59Z'
+
+    print(f"Start date: {start_date_iso}, End date: {end_date_iso}")
+
+    journal = Journal(JOURNAL_PATH) if JOURNAL_PATH else None
+    run_key = f"{repo_name}|{start_date_iso}|{end_date_iso}"
+    resumed_marks = journal.resume(run_key) if journal else None
+
+    marks = {}
+    if resumed_marks is not None:
+        # Keep the bounds the interrupted run started with: rows it committed out of order
+        # may already have moved the high-water marks past pages it never reached
+        marks = resumed_marks
+        print(f"Resuming interrupted run for {repo_name}")
+    elif incremental:
+        # A mark only narrows the range it falls inside. An older one means the range is not mined yet;
+        # a newer one comes from a later range and says nothing about this one, so both mine it in full
+        stored_marks = await loop.run_in_executor(None, get_high_water_marks, conn, schema_name)
+        marks = {table: mark for table, mark in stored_marks.items() if mark and start_date_iso < mark <= end_date_iso}
+    for table, mark in marks.items():
+        print(f"Incremental {table} since {mark}")
+
+    failures = []
+    run_failures.set(failures)
+
+    done = {}
+    if journal:
+        journal.start(run_key, marks)
+        done = {table: journal.completed(run_key, table) for table in tables}
+
+    bulk_comments = None
+    if API_BACKEND == 'graphql':
+        issues_stage, pull_requests_stage = get_issues_graphql, get_pull_requests_graphql
+    elif COMMENTS_MODE == 'bulk' and ('issues' in tables or 'pull_requests' in tables):
+        # Issues and pull requests share one pass over the repository's comments
+        bulk_comments = asyncio.ensure_future(get_repository_comments(engine, repo_name, start_date_iso))
+        issues_stage = partial(get_issues, bulk_comments=bulk_comments)
+        pull_requests_stage = partial(get_pull_requests, bulk_comments=bulk_comments)
+    else:
+        issues_stage, pull_requests_stage = get_issues, get_pull_requests
+
+    stages = {}
+    if 'commits' in tables:
+        stages['commits'] = get_commits(engine, repo_name, start_date_iso, end_date_iso, marks.get('commits'), done.get('commits', ()))
+    if 'issues' in tables:
+        stages['issues'] = issues_stage(engine, repo_name, start_date_iso, end_date_iso, marks.get('issues'), done.get('issues', ()))
+    if 'pull_requests' in tables:
+        stages['pull_requests'] = pull_requests_stage(engine, repo_name, start_date_iso, end_date_iso, marks.get('pull_requests'), done.get('pull_requests', ()))
+    if 'branches' in tables:
+        stages['branches'] = get_branches(engine, repo_name, done.get('branches', ()))
+
+    stats = {table: [0, 0.0] for table in stages}
+    exporter = create_exporter(schema_name, list(stages), EXPORT_FORMAT, EXPORT_COMPRESSION, EXPORT_INDEX, resumed_marks is not None)
+
+    # Pages are written to Postgres and the export as they arrive
+    def write_batch(table, rows):
+        elapsed = insert_rows(conn, schema_name, table, rows, DB_BATCH_SIZE, STORAGE_LAYOUT, COMMITS_PARTITION)
+        engine.metrics.db_write(table, len(rows), elapsed)
+        exporter.write(table, [export_record(row) for row in rows] if table in ('issues', 'pull_requests') else rows)
+        stats[table][0] += len(rows)
+        stats[table][1] += elapsed
+
+    def on_committed(table, checkpoints):
+        journal.mark(run_key, table, checkpoints)
+
+    try:
+        await run_pipeline(stages, write_batch, DB_BATCH_SIZE, on_committed if journal else None)
+        if failures:
+            # Failed pages and threads were never marked done, so the journal is kept and a rerun
+            # of the same range fetches only those
+            raise IncompleteRunError(f"{len(failures)} requests failed, so {repo_name} is incomplete. "
+                                     f"Run the same date range again to fetch what is missing.", stats)
+        # A stopped run keeps its journal so the next run with the same range picks up from there
+        if journal and not stop_process:
+            journal.finish(run_key)
+    finally:
+        if bulk_comments:
+            bulk_comments.cancel()
+        exporter.close()
+        if journal:
+            journal.close()
+    return stats
@@ -0,0 +1,71 @@
+import asyncio
+
+async def produce(queue, table, batches):
+    try:
+        async for rows, checkpoints in batches:
+            if rows or checkpoints:
+                await queue.put((table, rows, checkpoints))
+    finally:
+        # A cancelled producer leaves its stage suspended at yield; closing it runs the stage's
+        # own cleanup (cancelling its page requests) while the engine is still open
+        await batches.aclose()
+
+async def consume(queue, write_batch, batch_size, on_committed=None):
+    # Buffers up to batch_size rows per table; writes run in a worker thread so the
+    # event loop keeps fetching while the database is busy
+    loop = asyncio.get_running_loop()
+    buffers = {}
+
+    def flush(table, rows, checkpoints):
+        if rows:
+            write_batch(table, rows)
+        # Checkpoints are only reported once every row they cover is committed
+        if checkpoints and on_committed:
+            on_committed(table, checkpoints)
+
+    while True:
+        item = await queue.get()
+        if item is None:
+            break
+        table, rows, checkpoints = item
+        rows_buffer, checkpoints_buffer = buffers.setdefault(table, ([], []))
+        rows_buffer.extend(rows)
+        checkpoints_buffer.extend(checkpoints)
+        if len(rows_buffer) >= batch_size:
+            del buffers[table]
+            await loop.run_in_executor(None, flush, table, rows_buffer, checkpoints_buffer)
+
+    for table, (rows_buffer, checkpoints_buffer) in buffers.items():
+        await loop.run_in_executor(None, flush, table, rows_buffer, checkpoints_buffer)
+
+async def run_pipeline(stages, write_batch, batch_size, on_committed=None, queue_size=64):
+    # stages maps a table name to an async iterator of (rows, checkpoints) batches. The bounded
+    # queue applies backpressure, so fetched-but-unwritten rows stay within queue_size batches.
+    queue = asyncio.Queue(maxsize=queue_size)
+    consumer = asyncio.ensure_future(consume(queue, write_batch, batch_size, on_committed))
+    producers = [asyncio.ensure_future(produce(queue, table, batches)) for table, batches in stages.items()]
+
+    try:
+        running = set(producers)
+        while running:
+            finished, _ = await asyncio.wait(running | {consumer}, return_when=asyncio.FIRST_COMPLETED)
+            if consumer in finished:
+                # The consumer only stops before the sentinel when a write failed
+                consumer.result()
+            for task in finished - {consumer}:
+                running.discard(task)
+                task.result()
+    except BaseException:
+        # The first failure stops every stage, so none keeps fetching into a queue nobody reads
+        for task in producers:
+            task.cancel()
+        await asyncio.gather(*producers, return_exceptions=True)
+        raise
+    finally:
+        if not consumer.done():
+            # Flush whatever was fetched, even when a fetch stage failed. A write failing meanwhile
+            # would leave a full queue unread, so the sentinel doesn't wait past the consumer.
+            sentinel = asyncio.ensure_future(queue.put(None))
+            await asyncio.wait([sentinel, consumer], return_when=asyncio.FIRST_COMPLETED)
+            sentinel.cancel()
+            await consumer
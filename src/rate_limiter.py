@@ -0,0 +1,62 @@
+import asyncio
+from time import monotonic
+
+class AdaptiveLimiter:
+    # AIMD concurrency limit shared by every request of an engine. The limit starts at half the
+    # cap and grows by one per healthy response until the first throttle (slow start), then by
+    # about one per window of responses; a throttle halves it, at most once per cooldown, so a
+    # burst of rejected in-flight requests counts as a single congestion signal.
+    def __init__(self, max_limit, min_limit=1, cooldown=2.0):
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.limit = max(self.min_limit, max_limit / 2)
+        self.cooldown = cooldown
+        self.slow_start = True
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.condition = None
+
+    async def acquire(self):
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        async with self.condition:
+            while True:
+                pause = self.paused_until - monotonic()
+                if pause > 0:
+                    # Everyone waits out a secondary rate limit; wake up early if it is extended
+                    try:
+                        await asyncio.wait_for(self.condition.wait(), pause)
+                    except asyncio.TimeoutError:
+                        pass
+                elif self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                else:
+                    await self.condition.wait()
+
+    async def release(self, healthy=True):
+        # healthy=None frees the slot without touching the limit, for requests that never got an answer
+        if healthy:
+            self.limit = min(self.max_limit, self.limit + (1 if self.slow_start else 1 / self.limit))
+        elif healthy is not None:
+            self.decrease()
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def decrease(self):
+        now = monotonic()
+        if now - self.last_decrease >= self.cooldown:
+            self.limit = max(self.min_limit, self.limit / 2)
+            self.last_decrease = now
+            self.slow_start = False
+            print(f"Throttled by GitHub. Concurrency lowered to {int(self.limit)}.")
+
+    def pause(self, seconds):
+        # Requests rejected together report the same limit; only announce a pause that starts or extends one
+        self.decrease()
+        until = monotonic() + seconds
+        if until > self.paused_until + 1:
+            print(f"Secondary rate limit hit. Pausing requests for {seconds:.0f}s...")
+        self.paused_until = max(self.paused_until, until)
@@ -0,0 +1,66 @@
+import asyncio
+from time import time
+
+DEFAULT_RATE_LIMIT = 5000  # Hourly quota GitHub grants an authenticated token
+
+class Token:
+    __slots__ = ('index', 'username', 'token', 'limit', 'remaining', 'reset')
+
+    def __init__(self, index, username, token):
+        self.index = index
+        self.username = username
+        self.token = token
+        self.limit = DEFAULT_RATE_LIMIT
+        self.remaining = DEFAULT_RATE_LIMIT
+        self.reset = 0
+
+    @property
+    def auth(self):
+        return (self.username, self.token)
+
+class TokenPool:
+    # Single scheduler for every request of the process: each request borrows the token with the
+    # most quota left, and responses feed X-RateLimit-Remaining / X-RateLimit-Reset back in.
+    def __init__(self, usernames, tokens, low_limit=100):
+        self.tokens = [Token(index, username, token) for index, (username, token) in enumerate(zip(usernames, tokens))]
+        self.low_limit = low_limit
+
+    def _refill(self, now):
+        for token in self.tokens:
+            if token.reset and token.reset <= now:
+                token.remaining = token.limit
+                token.reset = 0
+
+    async def acquire(self):
+        while True:
+            now = time()
+            self._refill(now)
+            token = max(self.tokens, key=lambda t: t.remaining)
+            # The reserve never exceeds a tenth of the quota, so small quotas stay usable
+            if token.remaining >= min(self.low_limit, token.limit // 10 + 1):
+                # Reserve the call up front so concurrent requests spread across tokens
+                token.remaining -= 1
+                return token
+
+            earliest_reset = min(t.reset or now + 60 for t in self.tokens)
+            wait = max(earliest_reset - now, 0) + 1
+            print(f"All tokens have reached the limit. Waiting {wait:.0f}s for the earliest reset...")
+            await asyncio.sleep(wait)
+
+    def update(self, token, headers):
+        if 'X-RateLimit-Remaining' not in headers:
+            return
+        remaining = int(headers['X-RateLimit-Remaining'])
+        reset = int(headers.get('X-RateLimit-Reset', 0))
+        token.limit = int(headers.get('X-RateLimit-Limit', token.limit))
+        # Responses complete out of order, so within one window keep the lowest count seen
+        if reset == token.reset:
+            token.remaining = min(token.remaining, remaining)
+        elif reset > token.reset:
+            token.remaining = remaining
+            token.reset = reset
+
+    def exhaust(self, token, reset=None):
+        token.remaining = 0
+        token.reset = reset or token.reset or int(time()) + 60
+        print(f"Token limit reached for token {token.index + 1}. Switching to the next available token...")
@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import database
+
+class RecordingCursor:
+    def __init__(self):
+        self.deleted = []
+
+    def execute(self, query, params=None):
+        self.deleted.append(params[1])
+
+def thread(number, complete):
+    row = {'number': number, 'comments': [{'user': 'u', 'body': 'd', 'created_at': 'x'}, {'id': number * 10, 'user': 'c', 'body': 'b', 'created_at': 'y'}]}
+    if complete:
+        row['comments_complete'] = True
+    return row
+
+def test_comments_are_only_pruned_for_threads_fetched_in_full(monkeypatch):
+    inserted = []
+    monkeypatch.setattr(database, 'execute_values', lambda cursor, query, values, page_size: inserted.extend(values))
+    cursor = RecordingCursor()
+    database.upsert_comments(cursor, 's', 'issues', [thread(1, False)], 100)
+    assert cursor.deleted == []
+    database.upsert_comments(cursor, 's', 'issues', [thread(1, False), thread(2, True)], 100)
+    assert cursor.deleted == [[2]]
+    assert [value[0] for value in inserted] == [10, 10, 20]
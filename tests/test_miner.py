@@ -0,0 +1,33 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import miner
+from miner import project_repository_comments
+
+def comment(number, user, body='text'):
+    return {
+        'id': number * 10,
+        'issue_url': f'https://api.github.com/repos/o/r/issues/{number}',
+        'user': {'login': user} if user else None,
+        'body': body,
+        'created_at': '2023-01-01T00:00:00Z'
+    }
+
+def test_repository_comments_skip_deleted_users_without_shifting_threads():
+    page = [comment(1, None), comment(2, 'bob'), comment(3, 'carol'), {'id': 5, 'user': {'login': 'dave'}, 'body': 'x', 'created_at': 'y'}, comment(4, 'erin')]
+    projected = project_repository_comments(page)
+    assert [(number, essential['user']) for number, essential in projected] == [(2, 'bob'), (3, 'carol'), (4, 'erin')]
+
+def test_thread_with_a_failed_comment_page_is_not_stored_partially(monkeypatch):
+    async def fetch_page_data(engine, url, params, project=None):
+        if url.endswith('/2/comments') and params['page'] == 2:
+            return None, {}
+        return [{'id': params['page'], 'user': 'bob', 'body': 'text', 'created_at': 'y'}], {}
+    monkeypatch.setattr(miner, 'fetch_page_data', fetch_page_data)
+    threads = [{'number': number, 'comments': 150, 'comments_url': f'https://api.github.com/repos/o/r/issues/{number}/comments'} for number in (1, 2)]
+    comments = asyncio.run(miner.get_thread_comments(None, threads))
+    assert len(comments[0]) == 2
+    assert comments[1] is None
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from pipeline import run_pipeline
+
+async def slow_stage(name, closed, delay=0.01):
+    try:
+        for i in range(1000):
+            await asyncio.sleep(delay)
+            yield [{'stage': name, 'i': i}], [f'{name}-{i}']
+    finally:
+        closed.append(name)
+
+async def failing_stage(name, closed):
+    try:
+        yield [{'stage': name, 'i': 0}], [f'{name}-0']
+        await asyncio.sleep(0.05)
+        raise RuntimeError('fetch failed')
+    finally:
+        closed.append(name)
+
+def test_write_failure_closes_every_stage_before_returning():
+    closed = []
+
+    def write_batch(table, rows):
+        raise RuntimeError('write failed')
+
+    async def main():
+        stages = {'a': slow_stage('a', closed, 0), 'b': slow_stage('b', closed)}
+        with pytest.raises(RuntimeError, match='write failed'):
+            await run_pipeline(stages, write_batch, 1, queue_size=2)
+        assert sorted(closed) == ['a', 'b']
+
+    asyncio.run(main())
+
+def test_stage_failure_stops_the_other_stages_and_flushes_fetched_rows():
+    closed = []
+    written = []
+    committed = []
+
+    async def main():
+        stages = {'failing': failing_stage('failing', closed), 'slow': slow_stage('slow', closed, 1)}
+        with pytest.raises(RuntimeError, match='fetch failed'):
+            await run_pipeline(stages, lambda table, rows: written.extend(rows), 100,
+                               lambda table, checkpoints: committed.extend(checkpoints))
+        assert sorted(closed) == ['failing', 'slow']
+        assert written == [{'stage': 'failing', 'i': 0}]
+        assert committed == ['failing-0']
+
+    asyncio.run(main())